@@ -19,7 +19,6 @@
 from os.path import dirname, abspath, join as joinpath
 from setuptools import setup, find_packages as setuptools_find_packages
 import errno
-import os
 import subprocess
 
 base_version = "0.2"
@@ -31,17 +30,10 @@ base_project = "ccs-caldavtester"
 
 
 def find_packages():
-    modules = []
-
-    for pkg in filter(
-        lambda p: os.path.isdir(p) and os.path.isfile(os.path.join(p, "__init__.py")),
-        os.listdir(".")
-    ):
-        modules.extend([pkg, ] + [
-            "{}.{}".format(pkg, subpkg)
-            for subpkg in setuptools_find_packages(pkg)
-        ])
-    return modules
+    return setuptools_find_packages(
+        where=".",
+        include=("src", "src.*", "verifiers", "verifiers.*", "generators", "generators.*"),
+    )
 
 
 def git_info(wc_path):
@@ -21,8 +21,7 @@ Class to manage the testing process.
 from src.serverinfo import serverinfo
 
 from importlib import import_module
-from xml.etree.ElementTree import ElementTree
-from xml.parsers.expat import ExpatError
+from xml.etree.ElementTree import ElementTree, ParseError
 import getopt
 import os
 import random
@@ -140,7 +139,7 @@ class manager:
         # Open and parse the server config file
         try:
             tree = ElementTree(file=serverfile)
-        except ExpatError as e:
+        except ParseError as e:
             raise RuntimeError("Unable to parse file '%s' because: %s" % (serverfile, e,))
 
         # Verify that top-level element is correct
@@ -184,7 +183,7 @@ class manager:
             # Open and parse the config file
             try:
                 tree = ElementTree(file=fname)
-            except ExpatError as e:
+            except ParseError as e:
                 raise RuntimeError("Unable to parse file '%s' because: %s" % (fname, e,))
             caldavtest_node = tree.getroot()
             if caldavtest_node.tag != src.xmlDefs.ELEMENT_CALDAVTEST:
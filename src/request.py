@@ -18,11 +18,13 @@
 Defines the 'request' class which encapsulates an HTTP request and verification.
 """
 
+from collections import defaultdict
 from hashlib import md5, sha1
 from src.httpshandler import SmartHTTPConnection
 from src.xmlUtils import getYesNoAttributeValue
 from urllib.parse import quote, urlparse, urlunparse
 import base64
+import binascii
 import datetime
 import os
 import re
@@ -36,6 +38,23 @@ algorithms = {
     'sha': sha1,
 }
 
+# Patterns used to regenerate calendar data
+UID_PATTERN = re.compile("UID:.*")
+SUMMARY_PATTERN = re.compile("SUMMARY:(.*)")
+DTSTART_PATTERN = re.compile("(DTSTART;[^:]*):[0-9]{8,8}")
+DTEND_PATTERN = re.compile("(DTEND;[^:]*):[0-9]{8,8}")
+
+# Objects dynamically imported by generators and verifiers
+importCache = {}
+
+
+def _asbytes(value):
+    """
+    Digest calculations operate on bytes - encode any str value as utf-8.
+    """
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
 # DigestCalcHA1
 
 
@@ -61,35 +80,31 @@ def calcHA1(
     @param preHA1: If available this is a str containing a previously
        calculated HA1 as a hex string. If this is given then the values for
        pszUserName, pszRealm, and pszPassword are ignored.
+
+    @return: the HA1 value as hex encoded L{bytes}
     """
 
     if (preHA1 and (pszUserName or pszRealm or pszPassword)):
         raise TypeError(("preHA1 is incompatible with the pszUserName, "
                          "pszRealm, and pszPassword arguments"))
 
+    pszUserName = _asbytes(pszUserName)
+    pszRealm = _asbytes(pszRealm)
+    pszPassword = _asbytes(pszPassword)
+    pszNonce = _asbytes(pszNonce)
+    pszCNonce = _asbytes(pszCNonce)
+
     if preHA1 is None:
         # We need to calculate the HA1 from the username:realm:password
-        m = algorithms[pszAlg]()
-        m.update(pszUserName)
-        m.update(":")
-        m.update(pszRealm)
-        m.update(":")
-        m.update(pszPassword)
-        HA1 = m.digest()
+        HA1 = algorithms[pszAlg](b":".join((pszUserName, pszRealm, pszPassword))).digest()
     else:
         # We were given a username:realm:password
-        HA1 = preHA1.decode('hex')
+        HA1 = binascii.unhexlify(preHA1)
 
     if pszAlg == "md5-sess":
-        m = algorithms[pszAlg]()
-        m.update(HA1)
-        m.update(":")
-        m.update(pszNonce)
-        m.update(":")
-        m.update(pszCNonce)
-        HA1 = m.digest()
+        HA1 = algorithms[pszAlg](b":".join((HA1, pszNonce, pszCNonce))).digest()
 
-    return HA1.encode('hex')
+    return binascii.hexlify(HA1)
 
 
 # DigestCalcResponse
@@ -104,29 +119,28 @@ def calcResponse(
     pszDigestUri,
     pszHEntity,
 ):
-    m = algorithms[algo]()
-    m.update(pszMethod)
-    m.update(":")
-    m.update(pszDigestUri)
-    if pszQop == "auth-int":
-        m.update(":")
-        m.update(pszHEntity)
-    HA2 = m.digest().encode('hex')
-
-    m = algorithms[algo]()
-    m.update(HA1)
-    m.update(":")
-    m.update(pszNonce)
-    m.update(":")
+    """
+    @return: the request-digest as hex encoded L{bytes}
+    """
+    HA1 = _asbytes(HA1)
+    pszNonce = _asbytes(pszNonce)
+    pszNonceCount = _asbytes(pszNonceCount)
+    pszCNonce = _asbytes(pszCNonce)
+    pszQop = _asbytes(pszQop)
+    pszMethod = _asbytes(pszMethod)
+    pszDigestUri = _asbytes(pszDigestUri)
+    pszHEntity = _asbytes(pszHEntity)
+
+    a2 = [pszMethod, pszDigestUri]
+    if pszQop == b"auth-int":
+        a2.append(pszHEntity)
+    HA2 = binascii.hexlify(algorithms[algo](b":".join(a2)).digest())
+
     if pszNonceCount and pszCNonce and pszQop:
-        m.update(pszNonceCount)
-        m.update(":")
-        m.update(pszCNonce)
-        m.update(":")
-        m.update(pszQop)
-        m.update(":")
-    m.update(HA2)
-    respHash = m.digest().encode('hex')
+        kd = (HA1, pszNonce, pszNonceCount, pszCNonce, pszQop, HA2)
+    else:
+        kd = (HA1, pszNonce, HA2)
+    respHash = binascii.hexlify(algorithms[algo](b":".join(kd)).digest())
     return respHash
 
 
@@ -140,7 +154,7 @@ class request(object):
     be used to determine a satisfactory output or not.
     """
 
-    nc = {}  # Keep track of nonce count
+    nc = defaultdict(int)  # Keep track of nonce count
 
     def __init__(self, manager):
         self.manager = manager
@@ -186,18 +200,22 @@ class request(object):
 
     def getURI(self, si):
         uri = si.extrasubs(self.ruri)
-        if "**" in uri:
-            if "?" not in uri or uri.find("?") > uri.find("**"):
+        pos = uri.find("**")
+        if pos != -1:
+            query = uri.find("?")
+            if query == -1 or query > pos:
                 uri = uri.replace("**", str(uuid.uuid4()))
-        elif "##" in uri:
-            if "?" not in uri or uri.find("?") > uri.find("##"):
-                uri = uri.replace("##", str(self.count))
+        else:
+            pos = uri.find("##")
+            if pos != -1:
+                query = uri.find("?")
+                if query == -1 or query > pos:
+                    uri = uri.replace("##", str(self.count))
         return uri
 
     def getHeaders(self, si):
-        hdrs = self.headers
-        for key, value in hdrs.items():
-            hdrs[key] = si.extrasubs(value)
+        # Build a new set of headers each time so the substitutions are always applied to the original values
+        hdrs = {key: si.extrasubs(value) for key, value in self.headers.items()}
 
         # Content type
         if self.data is not None:
@@ -205,34 +223,37 @@ class request(object):
 
         # Auth
         if self.auth:
-            if si.authtype.lower() == "basic":
+            authtype = si.authtype.lower()
+            if authtype == "basic":
                 hdrs["Authorization"] = self.gethttpbasicauth(si)
-            elif si.authtype.lower() == "digest":
+            elif authtype == "digest":
                 hdrs["Authorization"] = self.gethttpdigestauth(si)
 
         return hdrs
 
     def gethttpbasicauth(self, si):
-        basicauth = [self.user, si.user][self.user == ""]
-        basicauth += ":"
-        basicauth += [self.pswd, si.pswd][self.pswd == ""]
-        basicauth = b"Basic " + base64.encodebytes(basicauth.encode('utf-8'))
-        basicauth = basicauth.replace(b"\n", b"")
-        return basicauth
+        user = self.user or si.user
+        pswd = self.pswd or si.pswd
+        return b"Basic " + base64.b64encode(("%s:%s" % (user, pswd,)).encode('utf-8'))
 
     def gethttpdigestauth(self, si, wwwauthorize=None):
 
+        # The URI is needed several times below and must be the same each time
+        uri = self.getURI(si)
+
         # Check the nonce cache to see if we've used this user before, or if the nonce is more than 5 minutes old
-        user = [self.user, si.user][self.user == ""]
-        pswd = [self.pswd, si.pswd][self.pswd == ""]
+        user = self.user or si.user
+        pswd = self.pswd or si.pswd
         details = None
         if user in self.manager.digestCache and self.manager.digestCache[user]["max-nonce-time"] > time.time():
             details = self.manager.digestCache[user]
         else:
+            olddetails = self.manager.digestCache.get(user)
+
             # Redo digest auth from scratch to get a new nonce etc
             http = SmartHTTPConnection(si.host, si.port, si.ssl, si.afunix)
             try:
-                puri = list(urlparse(self.getURI(si)))
+                puri = list(urlparse(uri))
                 puri[2] = quote(puri[2])
                 quri = urlunparse(puri)
                 http.request("OPTIONS", quri)
@@ -244,7 +265,7 @@ class request(object):
 
             if response.status == 401:
 
-                wwwauthorize = response.msg.getheaders("WWW-Authenticate")
+                wwwauthorize = response.msg.get_all("WWW-Authenticate", [])
                 for item in wwwauthorize:
                     if not item.lower().startswith("digest "):
                         continue
@@ -262,38 +283,53 @@ class request(object):
                         details[k.strip()] = unq(v.strip())
 
                     details["max-nonce-time"] = time.time() + 600
+
+                    # Carry over any previously calculated HA1 - it is re-validated against algorithm/user/realm/password below
+                    if olddetails is not None and '_ha1_key' in olddetails:
+                        details['_ha1'] = olddetails['_ha1']
+                        details['_ha1_key'] = olddetails['_ha1_key']
+
+                    # A different nonce means the old one will no longer be used so stop counting it
+                    if olddetails is not None and olddetails.get('nonce') != details.get('nonce'):
+                        self.nc.pop(olddetails.get('nonce'), None)
+
                     self.manager.digestCache[user] = details
                     break
 
         if details:
             if details.get('qop'):
-                if self.nc.get(details.get('nonce')) is None:
-                    self.nc[details.get('nonce')] = 1
-                else:
-                    self.nc[details.get('nonce')] += 1
-                details['nc'] = "%08x" % self.nc[details.get('nonce')]
+                nonce = details.get('nonce')
+                self.nc[nonce] += 1
+                details['nc'] = f"{self.nc[nonce]:08x}"
                 if details.get('cnonce') is None:
                     details['cnonce'] = "D4AAE4FF-ADA1-4149-BFE2-B506F9264318"
 
+            # HA1 only depends on hash algorithm, user, realm and password so cache it with the nonce details
+            algorithm = details.get('algorithm', 'md5')
+            ha1_algorithm = "md5" if algorithm == "md5-sess" else algorithm
+            ha1_key = (ha1_algorithm, user, details.get('realm'), pswd)
+            if details.get('_ha1_key') != ha1_key:
+                details['_ha1'] = calcHA1(ha1_algorithm, user, details.get('realm'), pswd, None, None)
+                details['_ha1_key'] = ha1_key
+
+            # Only md5-sess needs to re-hash the cached HA1 with the current nonce
+            if algorithm == "md5-sess":
+                ha1 = calcHA1(algorithm, None, None, None, details.get('nonce'), details.get('cnonce'), preHA1=details['_ha1'])
+            else:
+                ha1 = details['_ha1']
+
             digest = calcResponse(
-                calcHA1(details.get('algorithm', 'md5'), user, details.get('realm'), pswd, details.get('nonce'), details.get('cnonce')),
-                details.get('algorithm', 'md5'), details.get('nonce'), details.get('nc'), details.get('cnonce'), details.get('qop'), self.method, self.getURI(si), None
+                ha1,
+                algorithm, details.get('nonce'), details.get('nc'), details.get('cnonce'), details.get('qop'), self.method, uri, None
+            ).decode("utf-8")
+
+            response = (
+                f'Digest username="{user}", realm="{details.get("realm")}", '
+                f'nonce="{details.get("nonce")}", uri="{uri}", '
+                f'response={digest}, algorithm={algorithm}'
             )
-
             if details.get('qop'):
-                response = (
-                    'Digest username="%s", realm="%s", '
-                    'nonce="%s", uri="%s", '
-                    'response=%s, algorithm=%s, cnonce="%s", qop=%s, nc=%s' %
-                    (user, details.get('realm'), details.get('nonce'), self.getURI(si), digest, details.get('algorithm', 'md5'), details.get('cnonce'), details.get('qop'), details.get('nc'),)
-                )
-            else:
-                response = (
-                    'Digest username="%s", realm="%s", '
-                    'nonce="%s", uri="%s", '
-                    'response=%s, algorithm=%s' %
-                    (user, details.get('realm'), details.get('nonce'), self.getURI(si), digest, details.get('algorithm'),)
-                )
+                response += f', cnonce="{details.get("cnonce")}", qop={details.get("qop")}, nc={details.get("nc")}'
 
             return response
         else:
@@ -311,17 +347,12 @@ class request(object):
             if len(self.data.value) != 0:
                 data = self.data.value
             elif self.data.filepath:
-                # read in the file data
-                fd = open(self.data.nextpath if hasattr(self.data, "nextpath") else self.getFilePath(), "r")
-                try:
+                # read in the file data - text mode is needed as the data files use a mix of line endings
+                path = self.data.nextpath if hasattr(self.data, "nextpath") else self.getFilePath()
+                with open(path, "r", encoding="utf-8") as fd:
                     data = fd.read()
-                finally:
-                    fd.close()
-            data = str(self.manager.server_info.subs(data))
             self.manager.server_info.addextrasubs({"$request_count:": str(self.count)})
-            data = self.manager.server_info.extrasubs(data)
-            if self.data.substitutions:
-                data = self.manager.server_info.subs(data, self.data.substitutions)
+            data = str(self.manager.server_info.allsubs(data, self.data.substitutions))
             if self.data.generate:
                 if self.data.content_type.startswith("text/calendar"):
                     data = self.generateCalendarData(data)
@@ -331,9 +362,9 @@ class request(object):
 
     def getNextData(self):
         if not hasattr(self, "dataList"):
-            self.dataList = sorted([path for path in os.listdir(self.getFilePath()) if not path.startswith(".")])
+            self.dataList = self.listDataDirectory()
         if len(self.dataList):
-            self.data.nextpath = os.path.join(self.getFilePath(), self.dataList.pop(0))
+            self.data.nextpath = os.path.join(self.getFilePath(), self.dataList.pop())
             return True
         else:
             if hasattr(self.data, "nextpath"):
@@ -343,8 +374,17 @@ class request(object):
             return False
 
     def hasNextData(self):
-        dataList = sorted([path for path in os.listdir(self.getFilePath()) if not path.startswith(".")])
-        return len(dataList) != 0
+        # Always start a fresh pass as a previous one may have stopped early, but keep
+        # the listing so the getNextData iteration that follows does not read the directory again
+        self.dataList = self.listDataDirectory()
+        return len(self.dataList) != 0
+
+    def listDataDirectory(self):
+        """
+        List the non-hidden files in the data directory in reverse sorted order so
+        that items can be popped off the end in sorted order.
+        """
+        return sorted((entry.name for entry in os.scandir(self.getFilePath()) if not entry.name.startswith(".")), reverse=True)
 
     def generateCalendarData(self, data):
         """
@@ -354,12 +394,13 @@ class request(object):
         # Change the following iCalendar data values:
         # DTSTART, DTEND, RECURRENCE-ID, UID
 
-        data = re.sub("UID:.*", "UID:%s" % (uuid.uuid4(),), data)
-        data = re.sub("SUMMARY:(.*)", "SUMMARY:\\1 #%s" % (self.count,), data)
+        data = UID_PATTERN.sub("UID:%s" % (uuid.uuid4(),), data)
+        data = SUMMARY_PATTERN.sub("SUMMARY:\\1 #%s" % (self.count,), data)
 
         now = datetime.date.today()
-        data = re.sub("(DTSTART;[^:]*):[0-9]{8,8}", "\\1:%04d%02d%02d" % (now.year, now.month, now.day,), data)
-        data = re.sub("(DTEND;[^:]*):[0-9]{8,8}", "\\1:%04d%02d%02d" % (now.year, now.month, now.day,), data)
+        today = "\\1:%04d%02d%02d" % (now.year, now.month, now.day,)
+        data = DTSTART_PATTERN.sub(today, data)
+        data = DTEND_PATTERN.sub(today, data)
 
         return data
 
@@ -380,41 +421,23 @@ class request(object):
             self.afunix = self.manager.server_info.afunix2
 
         for child in node:
-            if child.tag == src.xmlDefs.ELEMENT_REQUIRE_FEATURE:
-                self.parseFeatures(child, require=True)
-            elif child.tag == src.xmlDefs.ELEMENT_EXCLUDE_FEATURE:
-                self.parseFeatures(child, require=False)
-            elif child.tag == src.xmlDefs.ELEMENT_METHOD:
-                self.method = child.text
-            elif child.tag == src.xmlDefs.ELEMENT_HEADER:
-                self.parseHeader(child)
-            elif child.tag == src.xmlDefs.ELEMENT_RURI:
-                self.ruri_quote = child.get(src.xmlDefs.ATTR_QUOTE, src.xmlDefs.ATTR_VALUE_YES) == src.xmlDefs.ATTR_VALUE_YES
-                self.ruris.append(self.manager.server_info.subs(child.text))
-                if len(self.ruris) == 1:
-                    self.ruri = self.ruris[0]
-            elif child.tag == src.xmlDefs.ELEMENT_DATA:
-                self.data = data(self.manager)
-                self.data.parseXML(child)
-            elif child.tag == src.xmlDefs.ELEMENT_VERIFY:
-                self.verifiers.append(verify(self.manager))
-                self.verifiers[-1].parseXML(child)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABURI:
-                self.graburi = child.text
-            elif child.tag == src.xmlDefs.ELEMENT_GRABCOUNT:
-                self.grabcount = child.text
-            elif child.tag == src.xmlDefs.ELEMENT_GRABHEADER:
-                self.parseGrab(child, self.grabheader)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABPROPERTY:
-                self.parseGrab(child, self.grabproperty)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABELEMENT:
-                self.parseMultiGrab(child, self.grabelement)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABJSON:
-                self.parseMultiGrab(child, self.grabjson)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABCALPROP:
-                self.parseGrab(child, self.grabcalprop)
-            elif child.tag == src.xmlDefs.ELEMENT_GRABCALPARAM:
-                self.parseGrab(child, self.grabcalparam)
+            parser = self.childParsers.get(child.tag)
+            if parser is not None:
+                parser(self, child)
+
+    def parseRURI(self, node):
+        self.ruri_quote = node.get(src.xmlDefs.ATTR_QUOTE, src.xmlDefs.ATTR_VALUE_YES) == src.xmlDefs.ATTR_VALUE_YES
+        self.ruris.append(self.manager.server_info.subs(node.text))
+        if len(self.ruris) == 1:
+            self.ruri = self.ruris[0]
+
+    def parseData(self, node):
+        self.data = data(self.manager)
+        self.data.parseXML(node)
+
+    def parseVerify(self, node):
+        self.verifiers.append(verify(self.manager))
+        self.verifiers[-1].parseXML(node)
 
     def parseFeatures(self, node, require=True):
         for child in node:
@@ -478,6 +501,25 @@ class request(object):
         if (name is not None) and (variable is not None):
             appendto.append((name, variable,) if parent is None else (name, parent, variable,))
 
+    # Map of child element tag to the method used to parse it
+    childParsers = {
+        src.xmlDefs.ELEMENT_REQUIRE_FEATURE: lambda self, child: self.parseFeatures(child, require=True),
+        src.xmlDefs.ELEMENT_EXCLUDE_FEATURE: lambda self, child: self.parseFeatures(child, require=False),
+        src.xmlDefs.ELEMENT_METHOD: lambda self, child: setattr(self, "method", child.text),
+        src.xmlDefs.ELEMENT_HEADER: parseHeader,
+        src.xmlDefs.ELEMENT_RURI: parseRURI,
+        src.xmlDefs.ELEMENT_DATA: parseData,
+        src.xmlDefs.ELEMENT_VERIFY: parseVerify,
+        src.xmlDefs.ELEMENT_GRABURI: lambda self, child: setattr(self, "graburi", child.text),
+        src.xmlDefs.ELEMENT_GRABCOUNT: lambda self, child: setattr(self, "grabcount", child.text),
+        src.xmlDefs.ELEMENT_GRABHEADER: lambda self, child: self.parseGrab(child, self.grabheader),
+        src.xmlDefs.ELEMENT_GRABPROPERTY: lambda self, child: self.parseGrab(child, self.grabproperty),
+        src.xmlDefs.ELEMENT_GRABELEMENT: lambda self, child: self.parseMultiGrab(child, self.grabelement),
+        src.xmlDefs.ELEMENT_GRABJSON: lambda self, child: self.parseMultiGrab(child, self.grabjson),
+        src.xmlDefs.ELEMENT_GRABCALPROP: lambda self, child: self.parseGrab(child, self.grabcalprop),
+        src.xmlDefs.ELEMENT_GRABCALPARAM: lambda self, child: self.parseGrab(child, self.grabcalparam),
+    }
+
 
 class data(object):
     """
@@ -536,15 +578,15 @@ class generator(object):
 
         # Re-do substitutions from values generated during the current test run
         if self.manager.server_info.hasextrasubs():
+            extrasubs = self.manager.server_info.extrasubs
             for name, values in self.args.items():
-                newvalues = [self.manager.server_info.extrasubs(value) for value in values]
-                self.args[name] = newvalues
+                self.args[name] = [extrasubs(value) for value in values]
 
         generatorClass = self._importName(self.callback, "Generator")
         gen = generatorClass()
 
         # Always clone the args as this verifier may be called multiple times
-        args = dict((k, list(v)) for k, v in self.args.items())
+        args = {k: v[:] for k, v in self.args.items()}
 
         return gen.generate(self.manager, args)
 
@@ -552,8 +594,11 @@ class generator(object):
         """
         Import a named object from a module in the context of this function.
         """
-        module = __import__(modulename, globals(), locals(), [name])
-        return getattr(module, name)
+        key = (modulename, name,)
+        if key not in importCache:
+            module = __import__(modulename, globals(), locals(), [name])
+            importCache[key] = getattr(module, name)
+        return importCache[key]
 
     def parseXML(self, node):
 
@@ -603,15 +648,15 @@ class verify(object):
 
         # Re-do substitutions from values generated during the current test run
         if self.manager.server_info.hasextrasubs():
+            extrasubs = self.manager.server_info.extrasubs
             for name, values in self.args.items():
-                newvalues = [self.manager.server_info.extrasubs(value) for value in values]
-                self.args[name] = newvalues
+                self.args[name] = [extrasubs(value) for value in values]
 
         verifierClass = self._importName("verifiers." + self.callback, "Verifier")
         verifier = verifierClass()
 
         # Always clone the args as this verifier may be called multiple times
-        args = dict((k, list(v)) for k, v in self.args.items())
+        args = {k: v[:] for k, v in self.args.items()}
 
         return verifier.verify(self.manager, uri, response, respdata, args)
 
@@ -619,8 +664,11 @@ class verify(object):
         """
         Import a named object from a module in the context of this function.
         """
-        module = __import__(modulename, globals(), locals(), [name])
-        return getattr(module, name)
+        key = (modulename, name,)
+        if key not in importCache:
+            module = __import__(modulename, globals(), locals(), [name])
+            importCache[key] = getattr(module, name)
+        return importCache[key]
 
     def parseXML(self, node):
 
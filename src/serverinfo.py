@@ -21,6 +21,7 @@ Class that encapsulates the server information for a CalDAV test run.
 import datetime
 import re
 import src.xmlDefs
+import sys
 from uuid import uuid4
 from urllib.parse import urlparse
 
@@ -45,6 +46,7 @@ class serverinfo:
         self.authtype = "basic"
         self.certdir = ""
         self.features = set()
+        self.features_version = 0
         self.user = ""
         self.pswd = ""
         self.waitcount = 120
@@ -79,6 +81,10 @@ class serverinfo:
 
     def subs(self, sub, db=None):
 
+        # Most strings have no variables at all
+        if "$" not in sub:
+            return sub
+
         # Special handling for relative date-times
         pos = sub.find("$now.")
         while pos != -1:
@@ -132,6 +138,23 @@ class serverinfo:
     def extrasubs(self, str):
         return self.subs(str, self.extrasubsdict)
 
+    def allsubs(self, sub, db=None):
+        """
+        Do the regular substitutions, then the extra ones, then any from the optional
+        supplied mapping. Each is a separate pass, so an earlier pass takes precedence
+        and each pass also expands any relative date-time or random UID variables the
+        previous one introduced. Passes stop as soon as no variables are left.
+
+        @param sub: string to do substitution in
+        @type sub: L{str}
+        @param db: additional mapping of substitution name to value
+        @type db: L{dict}
+        """
+        sub = self.extrasubs(self.subs(sub))
+        if db:
+            sub = self.subs(sub, db)
+        return sub
+
     def addextrasubs(self, items):
         processed = {}
 
@@ -207,7 +230,8 @@ class serverinfo:
     def parseFeatures(self, node):
         for child in node:
             if child.tag == src.xmlDefs.ELEMENT_FEATURE:
-                self.features.add(child.text)
+                self.features.add(child.text if child.text is None else sys.intern(child.text))
+        self.features_version += 1
 
     def updateParams(self):
 
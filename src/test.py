@@ -30,6 +30,20 @@ class test(object):
     all runs.
     """
 
+    __slots__ = (
+        "manager",
+        "name",
+        "details",
+        "count",
+        "stats",
+        "ignore",
+        "only",
+        "require_features",
+        "exclude_features",
+        "description",
+        "requests",
+    )
+
     def __init__(self, manager):
         self.manager = manager
         self.name = ""
@@ -21,6 +21,10 @@ Class that encapsulates a series of tests.
 from src.test import test
 from src.xmlUtils import getYesNoAttributeValue
 import src.xmlDefs
+import sys
+
+# Shared by every suite that declares no features, until one is added
+EMPTY_FEATURES = frozenset()
 
 
 class testsuite(object):
@@ -28,15 +32,32 @@ class testsuite(object):
     Maintains a list of tests to run as part of a 'suite'.
     """
 
+    __slots__ = (
+        "manager",
+        "name",
+        "ignore",
+        "only",
+        "changeuid",
+        "require_features",
+        "exclude_features",
+        "tests",
+        "_missing_features",
+        "_excluded_features",
+        "_features_version",
+    )
+
     def __init__(self, manager):
         self.manager = manager
         self.name = ""
         self.ignore = False
         self.only = False
         self.changeuid = False
-        self.require_features = set()
-        self.exclude_features = set()
+        self.require_features = EMPTY_FEATURES
+        self.exclude_features = EMPTY_FEATURES
         self.tests = []
+        self._missing_features = None
+        self._excluded_features = None
+        self._features_version = -1
 
     def aboutToRun(self):
         """
@@ -47,11 +68,24 @@ class testsuite(object):
         """
         return self.manager.server_info.newUIDs() if self.changeuid else set()
 
+    def _cacheFeatures(self):
+        """
+        Recompute the missing and excluded features only when the server's
+        feature set has changed since they were last computed.
+        """
+        server_info = self.manager.server_info
+        if self._features_version != server_info.features_version:
+            self._missing_features = self.require_features - server_info.features
+            self._excluded_features = self.exclude_features & server_info.features
+            self._features_version = server_info.features_version
+
     def missingFeatures(self):
-        return self.require_features - self.manager.server_info.features
+        self._cacheFeatures()
+        return self._missing_features
 
     def excludedFeatures(self):
-        return self.exclude_features & self.manager.server_info.features
+        self._cacheFeatures()
+        return self._excluded_features
 
     def parseXML(self, node):
         self.name = node.get(src.xmlDefs.ATTR_NAME, "")
@@ -60,19 +94,32 @@ class testsuite(object):
         self.changeuid = getYesNoAttributeValue(node, src.xmlDefs.ATTR_CHANGE_UID)
 
         for child in node:
-            if child.tag == src.xmlDefs.ELEMENT_REQUIRE_FEATURE:
-                self.parseFeatures(child, require=True)
-            elif child.tag == src.xmlDefs.ELEMENT_EXCLUDE_FEATURE:
-                self.parseFeatures(child, require=False)
-            elif child.tag == src.xmlDefs.ELEMENT_TEST:
-                t = test(self.manager)
-                t.parseXML(child)
-                self.tests.append(t)
+            parser = self.childParsers.get(child.tag)
+            if parser is not None:
+                parser(self, child)
+
+    def parseTest(self, node):
+        t = test(self.manager)
+        t.parseXML(node)
+        self.tests.append(t)
 
     def parseFeatures(self, node, require=True):
+        attr = "require_features" if require else "exclude_features"
+        features = getattr(self, attr)
         for child in node:
             if child.tag == src.xmlDefs.ELEMENT_FEATURE:
-                (self.require_features if require else self.exclude_features).add(child.text)
+                if features is EMPTY_FEATURES:
+                    features = set()
+                    setattr(self, attr, features)
+                features.add(child.text if child.text is None else sys.intern(child.text))
+        self._features_version = -1
+
+    # Map of child element tag to the method used to parse it
+    childParsers = {
+        src.xmlDefs.ELEMENT_TEST: parseTest,
+        src.xmlDefs.ELEMENT_REQUIRE_FEATURE: lambda self, child: self.parseFeatures(child, require=True),
+        src.xmlDefs.ELEMENT_EXCLUDE_FEATURE: lambda self, child: self.parseFeatures(child, require=False),
+    }
 
     def dump(self):
         print("\nTest Suite:")
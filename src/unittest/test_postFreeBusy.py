@@ -0,0 +1,165 @@
+##
+# Copyright (c) 2016 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+from verifiers.postFreeBusy import iterCalendarData, Verifier
+from xml.etree.ElementTree import ParseError
+import unittest
+import verifiers.postFreeBusy
+
+try:
+    # pycalendar is optional
+    import pycalendar
+except ImportError:
+    pycalendar = None
+
+
+class TestIterCalendarData(unittest.TestCase):
+
+    def testResponses(self):
+
+        data = b"""<?xml version="1.0" encoding="utf-8" ?>
+<C:schedule-response xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <C:response>
+    <C:recipient><D:href>mailto:user01@example.com</D:href></C:recipient>
+    <C:request-status>2.0;Success</C:request-status>
+    <C:calendar-data>one</C:calendar-data>
+  </C:response>
+  <C:response>
+    <C:recipient><D:href>mailto:user02@example.com</D:href></C:recipient>
+    <C:request-status>2.0;Success</C:request-status>
+    <C:calendar-data>two</C:calendar-data>
+  </C:response>
+</C:schedule-response>
+"""
+        self.assertEqual([elem.text for elem in iterCalendarData(data)], ["one", "two"])
+
+    def testWrongParent(self):
+        """
+        Only calendar-data directly inside a caldav:response is returned.
+        """
+
+        data = b"""<?xml version="1.0" encoding="utf-8" ?>
+<C:schedule-response xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <C:foo>
+    <C:calendar-data>foo</C:calendar-data>
+  </C:foo>
+  <D:response>
+    <C:calendar-data>dav</C:calendar-data>
+  </D:response>
+  <C:calendar-data>top</C:calendar-data>
+  <C:response>
+    <C:bar><C:calendar-data>nested</C:calendar-data></C:bar>
+    <C:calendar-data>ok</C:calendar-data>
+  </C:response>
+</C:schedule-response>
+"""
+        self.assertEqual([elem.text for elem in iterCalendarData(data)], ["ok"])
+
+    def testTruncated(self):
+
+        data = b"""<?xml version="1.0" encoding="utf-8" ?>
+<C:schedule-response xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <C:response>
+    <C:calendar-data>one</C:calendar-data>
+  </C:response>
+  <C:response>
+    <C:calendar-da"""
+        results = iterCalendarData(data)
+        self.assertEqual(next(results).text, "one")
+        self.assertRaises(ParseError, list, results)
+
+
+@unittest.skipIf(pycalendar is None, "pycalendar is not installed")
+class TestVerifier(unittest.TestCase):
+
+    class response(object):
+        status = 200
+
+    respdata = b"""<?xml version="1.0" encoding="utf-8" ?>
+<C:schedule-response xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <C:response>
+    <C:recipient><D:href>mailto:user01@example.com</D:href></C:recipient>
+    <C:request-status>2.0;Success</C:request-status>
+    <C:calendar-data>BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example Inc.//Example Calendar//EN
+METHOD:REPLY
+BEGIN:VFREEBUSY
+UID:4FD3AD926350
+DTSTAMP:20090602T190420Z
+DTSTART:20090602T000000Z
+DTEND:20090604T000000Z
+ATTENDEE:mailto:user01@example.com
+ORGANIZER:mailto:user02@example.com
+FREEBUSY;FBTYPE=BUSY:20090602T110000Z/20090602T120000Z
+FREEBUSY;FBTYPE=BUSY-TENTATIVE:20090603T110000Z/PT1H
+END:VFREEBUSY
+END:VCALENDAR
+</C:calendar-data>
+  </C:response>
+</C:schedule-response>
+"""
+
+    args = {
+        "attendee": ["mailto:user01@example.com"],
+        "busy": ["20090602T110000Z/20090602T120000Z"],
+        "tentative": ["20090603T110000Z/20090603T120000Z"],
+    }
+
+    def verify(self, respdata, args, lxml=True):
+        """
+        Run the verifier using either lxml or the ElementTree fallback to parse the response.
+        """
+        etree = verifiers.postFreeBusy.etree
+        if not lxml:
+            verifiers.postFreeBusy.etree = None
+        try:
+            return Verifier().verify(None, "/", self.response(), respdata, args)
+        finally:
+            verifiers.postFreeBusy.etree = etree
+
+    def testVerify(self):
+
+        for lxml in (True, False,):
+            if lxml and verifiers.postFreeBusy.etree is None:
+                continue
+            result, _ignore_txt = self.verify(self.respdata, self.args, lxml)
+            self.assertTrue(result)
+
+            args = dict(self.args)
+            args["busy"] = ["20090602T120000Z/20090602T130000Z"]
+            result, txt = self.verify(self.respdata, args, lxml)
+            self.assertFalse(result)
+            self.assertIn("Busy periods do not match", txt)
+
+            args = dict(self.args)
+            args["attendee"] = ["mailto:user03@example.com"]
+            result, txt = self.verify(self.respdata, args, lxml)
+            self.assertFalse(result)
+            self.assertIn("Could not find attendee", txt)
+
+    def testBadTail(self):
+        """
+        Bad XML after a bad calendar is reported as bad XML whichever parser is used.
+        """
+
+        respdata = self.respdata.replace(b"FBTYPE=BUSY:", b"FBTYPE=BOGUS:").replace(b"</C:schedule-response>", b"<C:response><C:calen")
+        for lxml in (True, False,):
+            if lxml and verifiers.postFreeBusy.etree is None:
+                continue
+            result, txt = self.verify(respdata, self.args, lxml)
+            self.assertFalse(result)
+            self.assertIn("Could not parse proper XML response", txt)
@@ -0,0 +1,117 @@
+##
+# Copyright (c) 2016 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+from hashlib import md5
+from src.manager import manager
+from src.request import calcHA1, calcResponse, data, request
+import os
+import tempfile
+import unittest
+
+
+class TestDigest(unittest.TestCase):
+
+    def testRFC2617Example(self):
+        """
+        The worked example from RFC 2617 section 3.5.
+        """
+
+        ha1 = calcHA1("md5", "Mufasa", "testrealm@host.com", "Circle Of Life", "dcd98b7102dd2f0e8b11d0f600bfb0c093", "0a4f113b")
+        self.assertEqual(ha1, b"939e7578ed9e3c518a452acee763bce9")
+
+        response = calcResponse(
+            ha1, "md5", "dcd98b7102dd2f0e8b11d0f600bfb0c093", "00000001", "0a4f113b", "auth", "GET", "/dir/index.html", None,
+        )
+        self.assertEqual(response, b"6629fae49393a05397450978507c4ef1")
+
+    def testPreHA1(self):
+
+        ha1 = calcHA1("md5", "Mufasa", "testrealm@host.com", "Circle Of Life", None, None)
+        self.assertEqual(calcHA1("md5", None, None, None, None, None, preHA1=ha1), ha1)
+        self.assertEqual(calcHA1("md5", None, None, None, None, None, preHA1=ha1.decode("utf-8")), ha1)
+
+    def testMD5Sess(self):
+
+        ha1 = calcHA1("md5", "user", "realm", "pswd", "nonce", "cnonce")
+        sess = calcHA1("md5-sess", "user", "realm", "pswd", "nonce", "cnonce")
+        self.assertNotEqual(sess, ha1)
+        self.assertEqual(calcHA1("md5-sess", None, None, None, b"nonce", b"cnonce", preHA1=ha1), sess)
+
+    def testNoQop(self):
+        """
+        Without qop the response is just KD(HA1, nonce:HA2).
+        """
+
+        ha1 = calcHA1("md5", "user", "realm", "pswd", "nonce", None)
+        self.assertEqual(ha1, md5(b"user:realm:pswd").hexdigest().encode("utf-8"))
+
+        ha2 = md5(b"GET:/").hexdigest()
+        expected = md5(("%s:nonce:%s" % (ha1.decode("utf-8"), ha2,)).encode("utf-8")).hexdigest()
+        response = calcResponse(ha1, "md5", "nonce", None, None, None, "GET", "/", None)
+        self.assertEqual(response, expected.encode("utf-8"))
+
+
+class TestIterateData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for name in ("2.ics", "1.ics", "3.ics", ".hidden",):
+            with open(os.path.join(self.tmpdir.name, name), "w"):
+                pass
+
+        m = manager(text=False)
+        m.server_info.port = 80
+        self.req = request(m)
+        self.req.data = data(m)
+        self.req.data.filepath = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def iterate(self, stop=None):
+        paths = []
+        while self.req.getNextData():
+            paths.append(os.path.basename(self.req.data.nextpath))
+            if len(paths) == stop:
+                break
+        return paths
+
+    def testIterateAll(self):
+
+        self.assertTrue(self.req.hasNextData())
+        self.assertEqual(self.iterate(), ["1.ics", "2.ics", "3.ics"])
+        self.assertFalse(hasattr(self.req.data, "nextpath"))
+
+    def testRestartAfterBreak(self):
+        """
+        A pass that stops early (e.g. a failure with wait-for-success) must not
+        leave a partly used listing behind for the next pass.
+        """
+
+        self.assertTrue(self.req.hasNextData())
+        self.assertEqual(self.iterate(stop=3), ["1.ics", "2.ics", "3.ics"])
+
+        self.assertTrue(self.req.hasNextData())
+        self.assertEqual(self.iterate(stop=1), ["1.ics"])
+
+        self.assertTrue(self.req.hasNextData())
+        self.assertEqual(self.iterate(), ["1.ics", "2.ics", "3.ics"])
+
+    def testEmptyDirectory(self):
+
+        for name in os.listdir(self.tmpdir.name):
+            os.remove(os.path.join(self.tmpdir.name, name))
+        self.assertFalse(self.req.hasNextData())
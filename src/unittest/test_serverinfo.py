@@ -0,0 +1,82 @@
+##
+# Copyright (c) 2016 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+from src.serverinfo import serverinfo
+from xml.etree.ElementTree import fromstring
+import datetime
+import unittest
+
+
+class TestAllSubs(unittest.TestCase):
+
+    def setUp(self):
+        self.si = serverinfo()
+        self.si.dtnow = datetime.date(2016, 1, 31)
+
+    def testNoVariables(self):
+
+        self.assertEqual(self.si.allsubs("plain text", {"$a:": "supplied"}), "plain text")
+
+    def testPrecedence(self):
+        """
+        Regular substitutions win over extra ones, which win over supplied ones.
+        """
+
+        self.si.subsdict.update({"$a:": "regular"})
+        self.si.addextrasubs({"$a:": "extra", "$b:": "extra"})
+        supplied = {"$a:": "supplied", "$b:": "supplied", "$c:": "supplied"}
+
+        self.assertEqual(self.si.allsubs("$a: $b: $c:", supplied), "regular extra supplied")
+        self.assertEqual(self.si.allsubs("$a: $b: $c:"), "regular extra $c:")
+
+    def testNestedVariables(self):
+        """
+        Each pass only expands variables from its own table, so a later table can
+        use earlier ones but not the other way round.
+        """
+
+        self.si.subsdict.update({"$r1:": "$r2:", "$r2:": "regular", "$r3:": "$x1:"})
+        self.si.addextrasubs({"$x1:": "$r2:+$x2:", "$x2:": "extra", "$x3:": "$s1:"})
+        supplied = {"$s1:": "$r2:", "$s2:": "$x1:"}
+
+        self.assertEqual(self.si.allsubs("$r1:"), "regular")
+        self.assertEqual(self.si.allsubs("$r3:"), "$r2:+extra")
+        self.assertEqual(self.si.allsubs("$x3:", supplied), "$r2:")
+        self.assertEqual(self.si.allsubs("$s2:", supplied), "$x1:")
+
+    def testNestedSpecialVariables(self):
+        """
+        Relative date-times and random UIDs in a table value are expanded by the
+        pass that follows the one that introduced them.
+        """
+
+        self.si.subsdict.update({"$r:": "$now.1:", "$u:": "$uidrandom:"})
+        self.si.addextrasubs({"$x:": "$now.month.1:"})
+
+        self.assertEqual(self.si.allsubs("$r:"), "20160201")
+        self.assertNotIn("$", self.si.allsubs("$u:"))
+        self.assertEqual(self.si.allsubs("$x:"), "$now.month.1:")
+        self.assertEqual(self.si.allsubs("$x:", {"$s:": "supplied"}), "201602")
+
+
+class TestFeatures(unittest.TestCase):
+
+    def testParseFeatures(self):
+
+        si = serverinfo()
+        si.parseFeatures(fromstring("<features><feature>caldav</feature><feature/></features>"))
+        self.assertEqual(si.features, set(("caldav", None,)))
+        self.assertEqual(si.features_version, 1)
@@ -31,7 +31,7 @@ def readStringElementList(node, ename):
 
 
 def getYesNoAttributeValue(node, attr):
-    return node.get(attr, src.xmlDefs.ATTR_VALUE_NO) == src.xmlDefs.ATTR_VALUE_YES
+    return node.get(attr) == src.xmlDefs.ATTR_VALUE_YES
 
 
 def getDefaultAttributeValue(node, attr, default):
@@ -84,7 +84,7 @@ class Verifier(object):
         if data is None:
             return False, "        Could not read data file"
 
-        data = manager.server_info.extrasubs(manager.server_info.subs(data))
+        data = manager.server_info.allsubs(data)
 
         def removePropertiesParameters(component):
 
@@ -63,8 +63,8 @@ class Verifier(object):
             for fp in fb.getProperties("FREEBUSY"):
                 periods = fp.getValue().getValues()
                 # Convert start/duration to start/end
-                for i in range(len(periods)):
-                    periods[i].getValue().setUseDuration(duration)
+                for period in periods:
+                    period.getValue().setUseDuration(duration)
                 # Check param
                 fbtype = "BUSY"
                 if fp.hasParameter("FBTYPE"):
@@ -24,9 +24,66 @@ try:
     from pycalendar.exceptions import InvalidData
 except ImportError:
     pass
-from io import StringIO
-from xml.etree.ElementTree import ElementTree
-from xml.parsers.expat import ExpatError
+try:
+    # lxml is optional
+    from lxml import etree
+except ImportError:
+    etree = None
+from io import BytesIO
+from xml.etree.ElementTree import iterparse, ParseError
+
+CALDAV_NAMESPACE = "urn:ietf:params:xml:ns:caldav"
+RESPONSE_TAG = "{%s}response" % (CALDAV_NAMESPACE,)
+CALENDAR_DATA_TAG = "{%s}calendar-data" % (CALDAV_NAMESPACE,)
+
+if etree is not None:
+    PARSER = etree.XMLParser(collect_ids=False, resolve_entities=False, no_network=True)
+    CALDATA_XPATH = etree.XPath(
+        "./caldav:response/caldav:calendar-data",
+        namespaces={"caldav": CALDAV_NAMESPACE},
+    )
+
+
+def iterCalendarData(data):
+    """
+    Incrementally parse a schedule-response and generate each of its
+    caldav:response/caldav:calendar-data elements. Each caldav:response is
+    discarded once it has been parsed so the whole document is never held in
+    memory at once.
+
+    @param data: the XML response body
+    @type data: L{bytes}
+    """
+    root = None
+    parent = None
+    depth = 0
+    for event, elem in iterparse(BytesIO(data), events=("start", "end",)):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            if depth == 2:
+                parent = elem.tag
+            continue
+
+        depth -= 1
+        if depth == 2 and elem.tag == CALENDAR_DATA_TAG and parent == RESPONSE_TAG:
+            yield elem
+        elif depth == 1:
+            root.remove(elem)
+
+
+def periodTexts(periods):
+    """
+    Convert each FREEBUSY period to start/end form and return the set of
+    their text values, fetching each period value only once.
+    """
+    texts = set()
+    for period in periods:
+        value = period.getValue()
+        value.setUseDuration(False)
+        texts.add(value.getText())
+    return texts
 
 
 class Verifier(object):
@@ -38,23 +95,35 @@ class Verifier(object):
             return False, "        HTTP Status Code Wrong: %d" % (response.status,)
 
         # Get expected FREEBUSY info
-        users = args.get("attendee", [])
+        users = set(args.get("attendee", []))
         busy = args.get("busy", [])
         tentative = args.get("tentative", [])
         unavailable = args.get("unavailable", [])
         events = args.get("events", [])
         if len(events) == 1:
-            events = int(eval(events[0]))
+            events = int(events[0])
         else:
             events = None
 
+        # The parsers work directly on the raw response bytes
+        if isinstance(respdata, str):
+            respdata = respdata.encode("utf-8")
+
         # Extract each calendar-data object
-        try:
-            tree = ElementTree(file=StringIO(respdata))
-        except ExpatError:
-            return False, "           Could not parse proper XML response\n"
+        if etree is not None:
+            try:
+                caldatas = CALDATA_XPATH(etree.fromstring(respdata, PARSER))
+            except etree.XMLSyntaxError:
+                return False, "           Could not parse proper XML response\n"
+        else:
+            # Collect every calendar-data first so that bad XML anywhere in the response
+            # is rejected before any calendar checks, just as it is with lxml
+            try:
+                caldatas = list(iterCalendarData(respdata))
+            except ParseError:
+                return False, "           Could not parse proper XML response\n"
 
-        for calendar in tree.findall("./{urn:ietf:params:xml:ns:caldav}response/{urn:ietf:params:xml:ns:caldav}calendar-data"):
+        for calendar in caldatas:
             # Parse data as calendar object
             try:
                 calendar = Calendar.parseText(calendar.text)
@@ -73,8 +142,9 @@ class Verifier(object):
 
                 # Check for attendee value
                 for attendee in fb.getProperties("ATTENDEE"):
-                    if attendee.getValue().getValue() in users:
-                        users.remove(attendee.getValue().getValue())
+                    value = attendee.getValue().getValue()
+                    if value in users:
+                        users.discard(value)
                         break
                 else:
                     continue
@@ -83,23 +153,21 @@ class Verifier(object):
                 busyp = []
                 tentativep = []
                 unavailablep = []
+                buckets = {
+                    "BUSY": busyp,
+                    "BUSY-TENTATIVE": tentativep,
+                    "BUSY-UNAVAILABLE": unavailablep,
+                }
                 for fp in fb.getProperties("FREEBUSY"):
                     periods = fp.getValue().getValues()
-                    # Convert start/duration to start/end
-                    for i in range(len(periods)):
-                        periods[i].getValue().setUseDuration(False)
                     # Check param
                     fbtype = "BUSY"
                     if fp.hasParameter("FBTYPE"):
                         fbtype = fp.getParameterValue("FBTYPE")
-                    if fbtype == "BUSY":
-                        busyp.extend(periods)
-                    elif fbtype == "BUSY-TENTATIVE":
-                        tentativep.extend(periods)
-                    elif fbtype == "BUSY-UNAVAILABLE":
-                        unavailablep.extend(periods)
-                    else:
+                    bucket = buckets.get(fbtype)
+                    if bucket is None:
                         raise ValueError("Unknown FBTYPE: %s" % (fbtype,))
+                    bucket.extend(periods)
 
                 # Set sizes must match
                 if (
@@ -109,23 +177,12 @@ class Verifier(object):
                 ):
                     raise ValueError("Period list sizes do not match.")
 
-                # Convert to string sets
-                busy = set(busy)
-                busyp = [x.getValue().getText() for x in busyp]
-                busyp = set(busyp)
-                tentative = set(tentative)
-                tentativep = [x.getValue().getText() for x in tentativep]
-                tentativep = set(tentativep)
-                unavailable = set(unavailable)
-                unavailablep = [x.getValue().getText() for x in unavailablep]
-                unavailablep = set(unavailablep)
-
-                # Compare all periods
-                if len(busyp.symmetric_difference(busy)):
+                # Compare all periods as string sets
+                if periodTexts(busyp) != set(busy):
                     raise ValueError("Busy periods do not match")
-                elif len(tentativep.symmetric_difference(tentative)):
+                elif periodTexts(tentativep) != set(tentative):
                     raise ValueError("Busy-tentative periods do not match")
-                elif len(unavailablep.symmetric_difference(unavailable)):
+                elif periodTexts(unavailablep) != set(unavailable):
                     raise ValueError("Busy-unavailable periods do not match")
 
                 # Check event count
@@ -142,7 +199,7 @@ class Verifier(object):
             except Exception as e:
                 return False, "        Response data is not calendar data: %s" % (e,)
 
-        if len(users):
+        if users:
             return False, "           Could not find attendee/calendar data in XML response\n"
 
         return True, ""